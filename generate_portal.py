@@ -33,40 +33,87 @@ También puedes generar un CSV de ejemplo:
 """
 from __future__ import annotations
 import argparse
+import asyncio
 import csv
+import functools
+import hashlib
+import json
+import multiprocessing
+import multiprocessing.util
 import os
 import re
 import sys
 import time
 import shutil
 import textwrap
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from html import escape
 from pathlib import Path
-from urllib.parse import urlparse
+from typing import Iterable, Iterator
 
 try:
     # Usado para placeholders si no hay imagen ni screenshot
-    from PIL import Image, ImageDraw, ImageFont  # type: ignore
+    from PIL import Image, ImageDraw, ImageFont, ImageOps  # type: ignore
     PIL_AVAILABLE = True
 except Exception:
     PIL_AVAILABLE = False
 
+# urllib3 es opcional: permite reutilizar conexiones (keep-alive) entre descargas
+try:
+    import urllib3  # type: ignore
+    URLLIB3_AVAILABLE = True
+except Exception:
+    URLLIB3_AVAILABLE = False
+
 # Playwright es opcional (solo si se piden screenshots)
 PLAYWRIGHT_AVAILABLE = False
 try:
     from playwright.sync_api import sync_playwright  # type: ignore
+    from playwright.async_api import async_playwright  # type: ignore
     PLAYWRIGHT_AVAILABLE = True
 except Exception:
     PLAYWRIGHT_AVAILABLE = False
 
+# Manifiesto de assets ya generados (builds incrementales), dentro del directorio de salida
+CACHE_FILE = ".cache.json"
+
+# Miniaturas: la tarjeta muestra ~176px de alto, no hace falta guardar 1280x800
+THUMB_SIZE = (640, 400)
+THUMB_QUALITY = 82
+THUMB_EXT = ".webp" if PIL_AVAILABLE else ".png"
+# Con Pillow el screenshot se re-codifica a WEBP; JPEG es mucho más liviano que PNG como intermedio
+SCREENSHOT_OPTS = {"type": "jpeg", "quality": 80} if PIL_AVAILABLE else {}
+
+# Descargas de imágenes simultáneas y copias locales simultáneas
+DOWNLOAD_WORKERS = 16
+COPY_WORKERS = 4
+# Buffer de escritura de descargas (1 MiB): menos syscalls en imágenes de varios MB
+COPY_BUFSIZE = 1024 * 1024
+
+# Espera máxima del evento "load" tras el DOMContentLoaded (no bloquea por beacons/analytics)
+LOAD_WAIT_MS = 5000
+# Resuelve en cuanto las fuentes están listas (evita parpadeo sin sleep fijo)
+FONTS_READY_JS = "document.fonts.ready.then(() => true)"
+# Peticiones que no aportan a una miniatura y que suelen demorar la carga (se abortan)
+BLOCKED_RESOURCE_TYPES = frozenset({"media", "font", "websocket", "other"})
+
+
+_SLUG_SPACES = re.compile(r"[\s_]+")
+_SLUG_SPACES_UNI = re.compile(r"\s+")
+_SLUG_NONWORD = re.compile(r"[^\w\-]")
+_SLUG_DASHES = re.compile(r"-+")
+
 
 def slugify(value: str, allow_unicode: bool = False) -> str:
     value = str(value)
     if allow_unicode:
-        value = re.sub(r"\s+", "-", value)
+        value = _SLUG_SPACES_UNI.sub("-", value)
     else:
-        value = re.sub(r"[\s_]+", "-", value)
-        value = re.sub(r"[^\w\-]", "", value)
-    value = re.sub(r"-+", "-", value).strip("-_")
+        value = _SLUG_SPACES.sub("-", value)
+        value = _SLUG_NONWORD.sub("", value)
+    value = _SLUG_DASHES.sub("-", value).strip("-_")
     return value.lower() or "item"
 
 
@@ -75,144 +122,665 @@ def ensure_dir(p: Path) -> None:
 
 
 def is_url(s: str) -> bool:
-    try:
-        return urlparse(s).scheme in {"http", "https"}
-    except Exception:
-        return False
+    # El esquema no distingue mayúsculas (como urlparse); basta mirar el prefijo
+    return s[:8].lower().startswith(("http://", "https://"))
+
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def _get_pool():
+    """PoolManager compartido (se crea al primer uso)."""
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                # Reintentos de conexión/lectura aparte de las redirecciones (urlopen sigue hasta 10)
+                _POOL = urllib3.PoolManager(num_pools=16, maxsize=32,
+                                            retries=urllib3.Retry(total=None, connect=2, read=2, redirect=10,
+                                                                  backoff_factor=0.3))
+    return _POOL
 
 
 def download_file(url: str, dest: Path) -> None:
-    import urllib.request
-    with urllib.request.urlopen(url) as r, open(dest, "wb") as f:
-        shutil.copyfileobj(r, f)
+    if not URLLIB3_AVAILABLE:
+        import urllib.request
+        with urllib.request.urlopen(url) as r, open(dest, "wb") as f:
+            shutil.copyfileobj(r, f, length=COPY_BUFSIZE)
+        return
+    with _get_pool().request("GET", url, preload_content=False) as r:
+        try:
+            if r.status >= 400:
+                raise OSError(f"HTTP {r.status}")
+            with open(dest, "wb") as f:
+                shutil.copyfileobj(r, f, length=COPY_BUFSIZE)
+        finally:
+            r.release_conn()
 
 
-def read_csv_rows(csv_path: Path) -> list[dict]:
-    rows: list[dict] = []
+def iter_csv_rows(csv_path: Path) -> Iterator[dict]:
     with open(csv_path, newline="", encoding="utf-8-sig") as f:
         reader = csv.DictReader(f)
+        # Normaliza claves una sola vez: las filas salen con encabezados ya limpios
+        reader.fieldnames = [h.strip() for h in reader.fieldnames or []]
         required = {"title", "url", "image", "description"}
-        missing = required - set(h.strip() for h in reader.fieldnames or [])
+        missing = required - set(reader.fieldnames)
         if missing:
             raise SystemExit(f"El CSV requiere encabezados: {sorted(required)}. Faltan: {sorted(missing)}")
         for i, row in enumerate(reader, start=2):
-            # Normaliza claves
-            row = {k.strip(): (v or "").strip() for k, v in row.items()}
+            row = {k: (v or "").strip() for k, v in row.items()}
             if not row.get("title") or not row.get("url"):
                 print(f"[ADVERTENCIA] Fila {i}: 'title' y 'url' son obligatorios. Se omite.")
                 continue
-            rows.append(row)
-    return rows
+            yield row
 
 
-def make_placeholder(text: str, out_path: Path, size=(1280, 800)) -> None:
-    if not PIL_AVAILABLE:
-        return
-    img = Image.new("RGB", size, (245, 245, 245))
-    draw = ImageDraw.Draw(img)
+@functools.lru_cache(maxsize=4)
+def _get_font(size: int) -> ImageFont.ImageFont:
     # Intento cargar una fuente, de lo contrario fuente por defecto
     try:
-        font = ImageFont.truetype("arial.ttf", 48)
+        return ImageFont.truetype("arial.ttf", size)
     except Exception:
-        font = ImageFont.load_default()
+        return ImageFont.load_default()
+
+
+@functools.lru_cache(maxsize=4)
+def _blank_image(size: tuple[int, int]) -> Image.Image:
+    # Fondo base; se copia en cada placeholder en vez de crearlo de cero
+    return Image.new("RGB", size, (245, 245, 245))
+
+
+def make_placeholder(text: str, out_path: Path, size=THUMB_SIZE) -> None:
+    # Se dibuja directamente al tamaño final: una sola codificación, sin pasar por make_thumbnail
+    if not PIL_AVAILABLE:
+        return
+    img = _blank_image(tuple(size)).copy()
+    draw = ImageDraw.Draw(img)
+    font = _get_font(max(1, size[1] * 48 // 800))  # 48px a 1280x800, proporcional
     wrapped = textwrap.fill(text, width=24)
     #w, h = draw.multiline_textsize(wrapped, font=font)
     bbox = draw.multiline_textbbox((0, 0), wrapped, font=font, align="center")
     w, h = bbox[2] - bbox[0], bbox[3] - bbox[1]
     draw.multiline_text(((size[0]-w)//2, (size[1]-h)//2), wrapped, fill=(20, 20, 20), font=font, align="center")
-    img.save(out_path)
+    img.save(out_path, quality=THUMB_QUALITY)
 
 
-def take_screenshot(url: str, out_path: Path, timeout_ms: int = 20000, full_page: bool = False) -> bool:
-    if not PLAYWRIGHT_AVAILABLE:
-        return False
+def make_thumbnail(src: Path, dest: Path | None = None) -> None:
+    """Reduce la imagen al tamaño de miniatura y la guarda como WEBP en `dest` (por defecto, en su lugar).
+
+    Escala para cubrir THUMB_SIZE (como `object-cover` en la tarjeta), nunca agranda.
+    Escribe a un temporal y lo renombra, así no se modifica un archivo enlazado.
+    Si la imagen no se puede abrir, se deja como está.
+    """
+    if not PIL_AVAILABLE:
+        return
+    dest = dest or src
+    tmp = dest.with_name(dest.name + ".tmp")
     try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            context = browser.new_context(viewport={"width": 1280, "height": 800})
-            page = context.new_page()
-            page.set_default_timeout(timeout_ms)
-            page.goto(url, wait_until="networkidle")
-            time.sleep(0.8)  # pequeño respiro para fuentes/animaciones
-            page.screenshot(path=str(out_path), full_page=full_page)
-            context.close()
-            browser.close()
-        return True
+        with Image.open(src) as img:
+            img.load()
+            # Aplica la orientación EXIF (el tag se pierde al re-codificar) y conserva el perfil de color
+            icc_profile = img.info.get("icc_profile")
+            img = ImageOps.exif_transpose(img)
+            scale = max(THUMB_SIZE[0] / img.width, THUMB_SIZE[1] / img.height)
+            if scale < 1:
+                img = img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))),
+                                 Image.Resampling.LANCZOS)
+            if img.mode not in ("RGB", "RGBA"):
+                img = img.convert("RGBA" if "A" in img.getbands() or "transparency" in img.info else "RGB")
+            img.save(tmp, "WEBP", quality=THUMB_QUALITY, icc_profile=icc_profile)
+        os.replace(tmp, dest)
     except Exception as e:
-        print(f"[ERROR] Screenshot falló para {url}: {e}")
+        tmp.unlink(missing_ok=True)
+        if dest != src:
+            _fast_copy(src, dest)
+        print(f"[ADVERTENCIA] No se pudo generar miniatura de '{src}': {e}")
+
+
+def _route_sync(route) -> None:
+    if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+        route.abort()
+    else:
+        route.continue_()
+
+
+async def _route_async(route) -> None:
+    if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+class ScreenshotSession:
+    """Mantiene un único Chromium abierto para todos los screenshots de la corrida.
+
+    Uso:
+        with ScreenshotSession() as shots:
+            shots.shoot(url, out_path)
+    """
+
+    def __init__(self, timeout_ms: int = 20000, full_page: bool = False, viewport=(1280, 800)):
+        self.timeout_ms = timeout_ms
+        self.full_page = full_page
+        self.viewport = {"width": viewport[0], "height": viewport[1]}
+        self._p = None
+        self._browser = None
+
+    def __enter__(self) -> "ScreenshotSession":
+        if PLAYWRIGHT_AVAILABLE:
+            try:
+                self._p = sync_playwright().start()
+                self._browser = self._p.chromium.launch(headless=True)
+            except Exception as e:
+                print(f"[ERROR] No se pudo iniciar Chromium: {e}")
+                self.__exit__(None, None, None)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self._browser is not None:
+            try:
+                self._browser.close()
+            except Exception:
+                pass
+            self._browser = None
+        if self._p is not None:
+            try:
+                self._p.stop()
+            except Exception:
+                pass
+            self._p = None
+
+    def shoot(self, url: str, out_path: Path) -> bool:
+        if self._browser is None:
+            return False
+        context = None
+        try:
+            context = self._browser.new_context(viewport=self.viewport)
+            context.route("**/*", _route_sync)
+            page = context.new_page()
+            page.set_default_timeout(self.timeout_ms)
+            page.goto(url, wait_until="domcontentloaded", timeout=self.timeout_ms)
+            try:
+                page.wait_for_load_state("load", timeout=LOAD_WAIT_MS)
+            except Exception:
+                pass  # para una miniatura basta con el primer render
+            try:
+                page.evaluate(FONTS_READY_JS)
+            except Exception:
+                pass
+            page.screenshot(path=str(out_path), full_page=self.full_page, **SCREENSHOT_OPTS)
+            return True
+        except Exception as e:
+            print(f"[ERROR] Screenshot falló para {url}: {e}")
+            return False
+        finally:
+            if context is not None:
+                try:
+                    context.close()
+                except Exception:
+                    pass
+
+
+async def screenshot_many(urls_targets: list[tuple[str, Path]], concurrency: int = 5, timeout_ms: int = 20000,
+                          full_page: bool = False, viewport=(1280, 800)) -> list[bool]:
+    """Toma varios screenshots en paralelo con un solo Chromium y un contexto por página.
+
+    Devuelve una lista de booleanos en el mismo orden que `urls_targets`.
+    """
+    if not PLAYWRIGHT_AVAILABLE or not urls_targets:
+        return [False] * len(urls_targets)
+    sem = asyncio.Semaphore(max(1, concurrency))
+    vp = {"width": viewport[0], "height": viewport[1]}
+
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+
+        async def one(url: str, out_path: Path) -> bool:
+            async with sem:
+                ctx = None
+                try:
+                    ctx = await browser.new_context(viewport=vp)
+                    await ctx.route("**/*", _route_async)
+                    page = await ctx.new_page()
+                    page.set_default_timeout(timeout_ms)
+                    await page.goto(url, wait_until="domcontentloaded", timeout=timeout_ms)
+                    try:
+                        await page.wait_for_load_state("load", timeout=LOAD_WAIT_MS)
+                    except Exception:
+                        pass  # para una miniatura basta con el primer render
+                    try:
+                        await page.evaluate(FONTS_READY_JS)
+                    except Exception:
+                        pass
+                    await page.screenshot(path=str(out_path), full_page=full_page, **SCREENSHOT_OPTS)
+                    return True
+                except Exception as e:
+                    print(f"[ERROR] Screenshot falló para {url}: {e}")
+                    return False
+                finally:
+                    if ctx is not None:
+                        try:
+                            await ctx.close()
+                        except Exception:
+                            pass
+
+        try:
+            return list(await asyncio.gather(*(one(u, t) for u, t in urls_targets)))
+        finally:
+            await browser.close()
+
+
+# Sesión de captura propia de cada proceso del pool (ver _worker_init)
+_WORKER_SESSION: ScreenshotSession | None = None
+
+
+def _worker_init(full_page: bool = False) -> None:
+    global _WORKER_SESSION
+    _WORKER_SESSION = ScreenshotSession(full_page=full_page).__enter__()
+    # Cierra Chromium cuando el proceso del pool termina (pool.close() + join())
+    multiprocessing.util.Finalize(_WORKER_SESSION, _WORKER_SESSION.__exit__, args=(None, None, None), exitpriority=10)
+
+
+def _worker_shoot(args: tuple[str, Path]) -> bool:
+    url, path = args
+    if _WORKER_SESSION is None:
         return False
+    return _WORKER_SESSION.shoot(url, path)
 
 
-def prepare_image(asset_dir: Path, title: str, url: str, image_field: str, take_shots: bool) -> str:
-    """Devuelve la ruta relativa al asset generado/copied para usar en HTML."""
-    ensure_dir(asset_dir)
+def capture_screenshots(urls_targets: list[tuple[str, Path]], concurrency: int = 5, full_page: bool = False,
+                        workers: int = 1) -> list[bool]:
+    """Captura en lote.
+
+    - workers > 1: pool de procesos, cada uno con su propio Chromium (ScreenshotSession).
+    - concurrency > 1: en paralelo vía asyncio en este proceso.
+    - si no, secuencial con ScreenshotSession.
+    """
+    if not PLAYWRIGHT_AVAILABLE or not urls_targets:
+        return [False] * len(urls_targets)
+    if workers > 1:
+        processes = min(workers, os.cpu_count() or 1, len(urls_targets))
+        # "spawn": el pool puede arrancar mientras corren los hilos de descarga (fork + hilos no es seguro)
+        ctx = multiprocessing.get_context("spawn")
+        pool = ctx.Pool(processes=processes, initializer=_worker_init, initargs=(full_page,))
+        try:
+            return pool.map(_worker_shoot, urls_targets)
+        finally:
+            pool.close()
+            pool.join()
+    if concurrency <= 1:
+        with ScreenshotSession(full_page=full_page) as shots:
+            return [shots.shoot(u, t) for u, t in urls_targets]
+    try:
+        return asyncio.run(screenshot_many(urls_targets, concurrency=concurrency, full_page=full_page))
+    except Exception as e:
+        print(f"[ERROR] No se pudo iniciar Chromium: {e}")
+        return [False] * len(urls_targets)
+
+
+def asset_target(asset_dir: Path, title: str) -> Path:
     base = slugify(title)[:40]
-    ext = ".png"
-    target = asset_dir / f"{base}{ext}"
+    ext = THUMB_EXT
+    return asset_dir / f"{base}{ext}"
+
+
+def _claim_target(target: Path, claimed: set[str]) -> Path:
+    # Títulos que dan el mismo slug ("Same", "Same!") se vuelven same, same-2, same-3...
+    # así ningún par de trabajos en paralelo escribe el mismo archivo
+    candidate, n = target, 1
+    while candidate.name in claimed:
+        n += 1
+        candidate = target.with_name(f"{target.stem}-{n}{target.suffix}")
+    claimed.add(candidate.name)
+    return candidate
 
+
+def _fast_copy(src: Path, target: Path) -> None:
+    """Copia `src` a `target` por la vía más barata disponible.
+
+    Intenta un hardlink (sin copiar bytes), luego copy_file_range en Linux (el
+    kernel puede hacer reflink/copia en servidor) y por último shutil.copyfile
+    (que en Linux ya usa sendfile).
+    """
+    target.unlink(missing_ok=True)
+    try:
+        os.link(src, target)
+        return
+    except OSError:
+        pass
+    if hasattr(os, "copy_file_range"):
+        try:
+            with open(src, "rb") as fsrc, open(target, "wb") as fdst:
+                remaining = os.fstat(fsrc.fileno()).st_size
+                while remaining > 0:
+                    n = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                    if n == 0:
+                        break
+                    remaining -= n
+            if remaining == 0:
+                return
+        except OSError:
+            pass
+    shutil.copyfile(src, target)
+
+
+def plan_image(asset_dir: Path, title: str, url: str, image_field: str, take_shots: bool) -> tuple[str, Path]:
+    """Decide cómo obtener la imagen de una fila sin hacer I/O pesado.
+
+    Devuelve (acción, destino) con acción en: "download", "copy", "screenshot", "placeholder".
+    """
+    target = asset_target(asset_dir, title)
     if image_field:
         if is_url(image_field):
-            try:
-                download_file(image_field, target)
-                return f"assets/{target.name}"
-            except Exception as e:
-                print(f"[ADVERTENCIA] No se pudo descargar imagen para '{title}': {e}")
+            return "download", target
+        if Path(image_field).exists():
+            return "copy", target
+        print(f"[ADVERTENCIA] Imagen no encontrada '{image_field}' para '{title}'.")
+    return _next_action(take_shots), target
+
+
+def _next_action(take_shots: bool) -> str:
+    return "screenshot" if take_shots and PLAYWRIGHT_AVAILABLE else "placeholder"
+
+
+def _download_job(row: dict) -> bool:
+    try:
+        download_file(row["image"], row["_target"])
+        make_thumbnail(row["_target"])
+        return True
+    except Exception as e:
+        print(f"[ADVERTENCIA] No se pudo descargar imagen para '{row.get('title', '')}': {e}")
+        return False
+
+
+def _copy_job(row: dict) -> bool:
+    try:
+        if PIL_AVAILABLE:
+            # Se lee el original y se escribe directamente la miniatura
+            make_thumbnail(Path(row["image"]), row["_target"])
         else:
-            src = Path(image_field)
-            if src.exists():
-                shutil.copy2(src, target)
-                return f"assets/{target.name}"
-            else:
-                print(f"[ADVERTENCIA] Imagen no encontrada '{image_field}' para '{title}'.")
-
-    if take_shots:
-        ok = take_screenshot(url, target)
+            _fast_copy(Path(row["image"]), row["_target"])
+        return True
+    except Exception as e:
+        print(f"[ADVERTENCIA] No se pudo copiar imagen para '{row.get('title', '')}': {e}")
+        return False
+
+
+def _placeholder_job(job: tuple[str, Path]) -> None:
+    # A nivel de módulo para poder enviarse a un ProcessPoolExecutor
+    text, target = job
+    make_placeholder(text, target)
+
+
+def make_placeholders(jobs: list[tuple[str, Path]]) -> None:
+    """Genera varios placeholders (texto, destino) repartidos entre los núcleos.
+
+    El layout del texto en PIL no suelta el GIL, por eso procesos y no hilos.
+    Con un solo trabajo o un solo núcleo se hace en línea (arrancar el pool
+    cuesta más que dibujar), y si el pool no puede iniciarse también. Los
+    errores propios de un trabajo (p. ej. disco lleno al guardar) se propagan.
+    """
+    workers = min(os.cpu_count() or 1, len(jobs))
+    pool = None
+    if workers > 1:
+        try:
+            # Crear el pool y encolar los trabajos es lo que arranca los procesos
+            pool = ProcessPoolExecutor(max_workers=workers)
+            results = pool.map(_placeholder_job, jobs, chunksize=max(1, len(jobs) // (workers * 4)))
+        except (OSError, NotImplementedError, ImportError) as e:
+            print(f"[ADVERTENCIA] Pool de procesos no disponible, placeholders en serie: {e}")
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+            pool = None
+    if pool is not None:
+        with pool:
+            try:
+                list(results)
+                return
+            except BrokenProcessPool as e:
+                print(f"[ADVERTENCIA] Pool de procesos no disponible, placeholders en serie: {e}")
+    for job in jobs:
+        _placeholder_job(job)
+
+
+def _screenshot_bucket(rows: list[dict], concurrency: int, full_page: bool, workers: int) -> None:
+    """Toma en lote los screenshots de `rows` y marca cada fila como "done" o "placeholder"."""
+    if not rows:
+        return
+    results = capture_screenshots([(r.get("url", ""), r["_target"]) for r in rows],
+                                  concurrency=concurrency, full_page=full_page, workers=workers)
+    for row, ok in zip(rows, results):
         if ok:
-            return f"assets/{target.name}"
+            make_thumbnail(row["_target"])
+            row["_action"] = "done"
         else:
-            print(f"[ADVERTENCIA] Screenshot no disponible para '{title}'.")
+            print(f"[ADVERTENCIA] Screenshot no disponible para '{row.get('title', '')}'.")
+            row["_action"] = "placeholder"
 
-    # Fallback placeholder si PIL está disponible; si no, devolverá una ruta vacía
-    if PIL_AVAILABLE:
-        make_placeholder(title or url, target)
-        return f"assets/{target.name}"
-    else:
-        return ""
 
+def asset_key(title: str, url: str, image_field: str, take_shots: bool = False, full_page: bool = False) -> str:
+    """Clave de caché de una fila.
+
+    Cambia si cambian título, URL, imagen, el mtime de la imagen local o el modo
+    de captura (screenshots efectivos y página completa).
+    """
+    mtime = ""
+    if image_field and not is_url(image_field):
+        try:
+            mtime = str(Path(image_field).stat().st_mtime)
+        except OSError:
+            pass
+    shots = take_shots and PLAYWRIGHT_AVAILABLE
+    raw = f"{title}|{url}|{image_field}|{mtime}|{int(shots)}|{int(shots and full_page)}"
+    return hashlib.blake2b(raw.encode(), digest_size=12).hexdigest()
+
+
+def load_cache(out_dir: Path) -> dict[str, str]:
+    try:
+        data = json.loads((out_dir / CACHE_FILE).read_text(encoding="utf-8"))
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(out_dir: Path, cache: dict[str, str]) -> None:
+    (out_dir / CACHE_FILE).write_text(json.dumps(cache, indent=2, sort_keys=True), encoding="utf-8")
+
+
+def prepare_images(rows: list[dict], asset_dir: Path, take_shots: bool, concurrency: int = 5, full_page: bool = False,
+                   cache: dict[str, str] | None = None, workers: int = 1) -> dict[str, str]:
+    """Asigna row["image_final"] (ruta relativa para el HTML) a cada fila.
+
+    Primero planifica la acción de cada fila y la agrupa por tipo de trabajo:
+    descargas y copias locales en pools de hilos, screenshots en lote (a la par
+    de los hilos) y placeholders en un pool de procesos. Lo que falle cae al
+    siguiente paso (screenshot y luego placeholder).
 
-def build_html(items: list[dict], portal_title: str, portal_desc: str) -> str:
-    # Tailwind vía CDN para diseño rápido + un poco de JS para búsqueda/tema y animaciones
-    # Nota: Todo es estático; no requiere servidores.
-    html = f"""<!DOCTYPE html>
+    Las filas presentes en `cache` (clave -> nombre del asset) cuyo archivo
+    todavía existe se reutilizan sin tocar la red ni el navegador. Devuelve la
+    caché actualizada con los assets de esta corrida.
+    """
+    ensure_dir(asset_dir)
+    cache = cache or {}
+    claimed: set[str] = set()
+    for row in rows:
+        row["_action"], target = plan_image(asset_dir, row.get("title", ""), row.get("url", ""),
+                                            row.get("image", ""), take_shots)
+        row["_target"] = _claim_target(target, claimed)
+        row["_key"] = asset_key(row.get("title", ""), row.get("url", ""), row.get("image", ""), take_shots, full_page)
+        # Un placeholder planificado desde el inicio es el resultado esperado y se cachea;
+        # uno al que se llegó por un fallo no (ver más abajo)
+        row["_planned"] = row["_action"]
+        if cache.get(row["_key"]) == row["_target"].name and row["_target"].exists():
+            row["_action"] = "cached"
+        else:
+            # Rompe un posible hardlink de una corrida anterior antes de reescribir el asset
+            row["_target"].unlink(missing_ok=True)
+
+    # Cada tipo de trabajo en su primitiva: red y disco en pools de hilos que
+    # corren en segundo plano mientras se toman los screenshots en lote.
+    downloads = [r for r in rows if r["_action"] == "download"]
+    copies = [r for r in rows if r["_action"] == "copy"]
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as net, ThreadPoolExecutor(max_workers=COPY_WORKERS) as disk:
+        download_results = net.map(_download_job, downloads)
+        copy_results = disk.map(_copy_job, copies)
+        _screenshot_bucket([r for r in rows if r["_action"] == "screenshot"], concurrency, full_page, workers)
+        for row, ok in zip(downloads, download_results):
+            row["_action"] = "done" if ok else _next_action(take_shots)
+        for row, ok in zip(copies, copy_results):
+            row["_action"] = "done" if ok else _next_action(take_shots)
+
+    # Descargas/copias fallidas que caen a screenshot
+    _screenshot_bucket([r for r in rows if r["_action"] == "screenshot"], concurrency, full_page, workers)
+
+    # Placeholders (CPU) en un pool de procesos
+    placeholders = [r for r in rows if r["_action"] == "placeholder"]
+    if placeholders and PIL_AVAILABLE:
+        make_placeholders([(r.get("title") or r.get("url", ""), r["_target"]) for r in placeholders])
+
+    new_cache: dict[str, str] = {}
+    for row in rows:
+        if row["_action"] == "placeholder" and not PIL_AVAILABLE:
+            # Sin PIL no hay placeholder; devolverá una ruta vacía
+            row["image_final"] = ""
+        else:
+            row["image_final"] = f"assets/{row['_target'].name}"
+            # Un placeholder de respaldo no se cachea: así se reintenta la imagen/screenshot
+            if row["_action"] != "placeholder" or row["_planned"] == "placeholder":
+                new_cache[row["_key"]] = row["_target"].name
+        del row["_action"], row["_target"], row["_key"], row["_planned"]
+    return new_cache
+
+
+# Hoja de estilos estática (se escribe como styles.css junto a index.html).
+# Contiene solo las utilidades estilo Tailwind que usan las plantillas, en vez de
+# cargar el JIT de Tailwind desde su CDN en cada visita.
+# El modo oscuro se activa con la clase .dark en <html> (ver el JS del tema).
+STYLES_CSS = """*, ::before, ::after { box-sizing: border-box; border: 0 solid #e2e8f0; }
+html { line-height: 1.5; -webkit-text-size-adjust: 100%; font-family: Inter, system-ui, -apple-system, Segoe UI, Roboto, Arial, sans-serif; }
+body { margin: 0; line-height: inherit; }
+h1, h3, p { margin: 0; font-size: inherit; font-weight: inherit; }
+a { color: inherit; text-decoration: inherit; }
+img { display: block; max-width: 100%; height: auto; }
+button, input { font: inherit; color: inherit; margin: 0; padding: 0; line-height: inherit; }
+button { background: transparent; cursor: pointer; }
+input::placeholder { color: #94a3b8; }
+
+:root { --card-r: 18px; }
+.card:hover img { transform: scale(1.04); }
+.card img { transition: transform .25s ease; }
+.shine { position: relative; overflow: hidden; }
+.shine::after {
+  content: ""; position: absolute; top:0; left:-150%; width: 50%; height: 100%;
+  background: linear-gradient(120deg, transparent, rgba(255,255,255,.25), transparent);
+  transform: skewX(-20deg);
+}
+.card:hover .shine::after { left: 150%; transition: left .75s ease; }
+
+.block { display: block; }
+.flex { display: flex; }
+.grid { display: grid; }
+.flex-col { flex-direction: column; }
+.items-center { align-items: center; }
+.grid-cols-1 { grid-template-columns: repeat(1, minmax(0, 1fr)); }
+.gap-3 { gap: .75rem; }
+.gap-4 { gap: 1rem; }
+.gap-6 { gap: 1.5rem; }
+.min-h-screen { min-height: 100vh; }
+.max-w-7xl { max-width: 80rem; }
+.mx-auto { margin-left: auto; margin-right: auto; }
+.w-full { width: 100%; }
+.w-64 { width: 16rem; }
+.h-44 { height: 11rem; }
+.mt-1 { margin-top: .25rem; }
+.mt-2 { margin-top: .5rem; }
+.mt-3 { margin-top: .75rem; }
+.mt-6 { margin-top: 1.5rem; }
+.mt-10 { margin-top: 2.5rem; }
+.p-4 { padding: 1rem; }
+.px-3 { padding-left: .75rem; padding-right: .75rem; }
+.px-4 { padding-left: 1rem; padding-right: 1rem; }
+.py-2 { padding-top: .5rem; padding-bottom: .5rem; }
+.py-8 { padding-top: 2rem; padding-bottom: 2rem; }
+.overflow-hidden { overflow: hidden; }
+.object-cover { object-fit: cover; }
+.rounded-xl { border-radius: .75rem; }
+.rounded-2xl { border-radius: 1rem; }
+.rounded-t-2xl { border-top-left-radius: 1rem; border-top-right-radius: 1rem; }
+.border { border-width: 1px; }
+.border-slate-200 { border-color: #e2e8f0; }
+.border-slate-300 { border-color: #cbd5e1; }
+.bg-slate-50 { background-color: #f8fafc; }
+.bg-slate-200 { background-color: #e2e8f0; }
+.bg-white\\/70 { background-color: rgba(255,255,255,.7); }
+.bg-white\\/80 { background-color: rgba(255,255,255,.8); }
+.shadow-sm { box-shadow: 0 1px 2px 0 rgba(0,0,0,.05); }
+.outline-none { outline: 2px solid transparent; outline-offset: 2px; }
+.focus\\:ring-2:focus { box-shadow: 0 0 0 2px var(--ring-color, #818cf8); }
+.focus\\:ring-indigo-400:focus { --ring-color: #818cf8; }
+.text-center { text-align: center; }
+.text-xs { font-size: .75rem; line-height: 1rem; }
+.text-sm { font-size: .875rem; line-height: 1.25rem; }
+.text-lg { font-size: 1.125rem; line-height: 1.75rem; }
+.text-3xl { font-size: 1.875rem; line-height: 2.25rem; }
+.font-semibold { font-weight: 600; }
+.font-extrabold { font-weight: 800; }
+.leading-tight { line-height: 1.25; }
+.text-slate-500 { color: #64748b; }
+.text-slate-600 { color: #475569; }
+.text-slate-900 { color: #0f172a; }
+.truncate { overflow: hidden; text-overflow: ellipsis; white-space: nowrap; }
+.line-clamp-2, .line-clamp-3 { overflow: hidden; display: -webkit-box; -webkit-box-orient: vertical; }
+.line-clamp-2 { -webkit-line-clamp: 2; }
+.line-clamp-3 { -webkit-line-clamp: 3; }
+
+.dark { color-scheme: dark; }
+.dark .dark\\:bg-slate-700 { background-color: #334155; }
+.dark .dark\\:bg-slate-800\\/60 { background-color: rgba(30,41,59,.6); }
+.dark .dark\\:bg-slate-800\\/70 { background-color: rgba(30,41,59,.7); }
+.dark .dark\\:bg-slate-900 { background-color: #0f172a; }
+.dark .dark\\:border-slate-700 { border-color: #334155; }
+.dark .dark\\:text-slate-100 { color: #f1f5f9; }
+.dark .dark\\:text-slate-300 { color: #cbd5e1; }
+
+@media (min-width: 640px) {
+  .sm\\:flex-row { flex-direction: row; }
+  .sm\\:items-end { align-items: flex-end; }
+  .sm\\:justify-between { justify-content: space-between; }
+  .sm\\:grid-cols-2 { grid-template-columns: repeat(2, minmax(0, 1fr)); }
+  .sm\\:px-6 { padding-left: 1.5rem; padding-right: 1.5rem; }
+  .sm\\:text-4xl { font-size: 2.25rem; line-height: 2.5rem; }
+}
+@media (min-width: 1024px) {
+  .lg\\:grid-cols-3 { grid-template-columns: repeat(3, minmax(0, 1fr)); }
+  .lg\\:px-8 { padding-left: 2rem; padding-right: 2rem; }
+}
+@media (min-width: 1280px) {
+  .xl\\:grid-cols-4 { grid-template-columns: repeat(4, minmax(0, 1fr)); }
+}
+"""
+
+# Plantilla de la página partida en dos: todo hasta abrir el grid y el cierre.
+# Estilos en styles.css + un poco de JS para búsqueda/tema y animaciones
+# Nota: Todo es estático; no requiere servidores.
+_HEAD_AND_BODY_OPEN = """<!DOCTYPE html>
 <html lang=\"es\">
 <head>
   <meta charset=\"utf-8\" />
   <meta name=\"viewport\" content=\"width=device-width, initial-scale=1\" />
-  <title>{portal_title}</title>
+  <title>{title}</title>
   <link rel=\"preconnect\" href=\"https://fonts.googleapis.com\"> 
   <link rel=\"preconnect\" href=\"https://fonts.gstatic.com\" crossorigin>
   <link href=\"https://fonts.googleapis.com/css2?family=Inter:wght@400;600;800&display=swap\" rel=\"stylesheet\">
-  <script src=\"https://cdn.tailwindcss.com\"></script>
-<style>
-    :root {{ --card-r: 18px; }}
-    html {{ font-family: Inter, system-ui, -apple-system, Segoe UI, Roboto, Arial, sans-serif; }}
-    .card:hover img {{ transform: scale(1.04); }}
-    .card img {{ transition: transform .25s ease; }}
-    .shine {{ position: relative; overflow: hidden; }}
-    .shine::after {{
-      content: \"\"; position: absolute; top:0; left:-150%; width: 50%; height: 100%;
-      background: linear-gradient(120deg, transparent, rgba(255,255,255,.25), transparent);
-      transform: skewX(-20deg);
-    }}
-    .card:hover .shine::after {{ left: 150%; transition: left .75s ease; }}
-</style>
+  <link rel=\"stylesheet\" href=\"styles.css\">
 </head>
 <body class=\"bg-slate-50 text-slate-900 dark:bg-slate-900 dark:text-slate-100 min-h-screen\">
   <div class=\"max-w-7xl mx-auto px-4 sm:px-6 lg:px-8 py-8\">
     <header class=\"flex flex-col gap-4 sm:flex-row sm:items-end sm:justify-between\">
       <div>
-        <h1 class=\"text-3xl sm:text-4xl font-extrabold\">{portal_title}</h1>
-        <p class=\"mt-1 text-slate-600 dark:text-slate-300\">{portal_desc}</p>
+        <h1 class=\"text-3xl sm:text-4xl font-extrabold\">{title}</h1>
+        <p class=\"mt-1 text-slate-600 dark:text-slate-300\">{desc}</p>
       </div>
       <div class=\"flex items-center gap-3 mt-2\">
         <input id=\"search\" type=\"search\" placeholder=\"Buscar...\" class=\"w-64 rounded-xl border border-slate-300 dark:border-slate-700 bg-white/80 dark:bg-slate-800/60 px-3 py-2 outline-none focus:ring-2 focus:ring-indigo-400\" />
@@ -222,11 +790,13 @@ def build_html(items: list[dict], portal_title: str, portal_desc: str) -> str:
 
     <main class=\"mt-6\">
       <div id=\"grid\" class=\"grid gap-6 grid-cols-1 sm:grid-cols-2 lg:grid-cols-3 xl:grid-cols-4\">
-        {''.join(render_card(i) for i in items)}
+        """
+
+_BODY_CLOSE = """
       </div>
     </main>
 
-    <footer class=\"text-center text-sm text-slate-500 mt-10\">Generado automáticamente — {time.strftime('%Y-%m-%d')}</footer>
+    <footer class=\"text-center text-sm text-slate-500 mt-10\">Generado automáticamente — {date}</footer>
   </div>
 
   <script>
@@ -261,36 +831,60 @@ def build_html(items: list[dict], portal_title: str, portal_desc: str) -> str:
 </body>
 </html>
 """
-    return html
+
+
+def iter_html(items: Iterable[dict], portal_title: str, portal_desc: str) -> Iterator[str]:
+    """Genera el HTML por fragmentos (cabecera, una tarjeta por fila, cierre)."""
+    yield _HEAD_AND_BODY_OPEN.format(title=escape(portal_title), desc=escape(portal_desc))
+    for item in items:
+        yield render_card(item)
+    yield _BODY_CLOSE.format(date=time.strftime('%Y-%m-%d'))
 
 
 def render_card(item: dict) -> str:
-    title = item.get("title", "").strip()
-    desc = item.get("description", "").strip()
-    url = item.get("url", "").strip()
-    img = item.get("image_final", "").strip()
-    title_html = (title or url).replace('"', '&quot;')
-    desc_html = desc.replace('"', '&quot;')
-    url_html = url.replace('"', '&quot;')
+    return _render_card(item.get("title", "").strip(), item.get("description", "").strip(),
+                        item.get("url", "").strip(), item.get("image_final", "").strip())
 
-    img_tag = f'<img src="{img}" alt="{title_html}" class="w-full h-44 object-cover rounded-t-2xl" loading="lazy">' if img else '<div class="w-full h-44 bg-slate-200 dark:bg-slate-700 rounded-t-2xl"></div>'
 
-    return f"""
+# Plantillas de tarjeta: se rellenan con format_map y valores ya escapados
+CARD_TEMPLATE = """
       <article tabindex=\"0\" class=\"card group rounded-2xl overflow-hidden bg-white/70 dark:bg-slate-800/70 border border-slate-200 dark:border-slate-700 shadow-sm focus:ring-2 focus:ring-indigo-400\" 
-               data-title=\"{title_html.lower()}\" data-desc=\"{desc_html.lower()}\" data-url=\"{url_html.lower()}\" data-href=\"{url_html}\">
-        <a href=\"{url_html}\" target=\"_blank\" class=\"block shine\">{img_tag}</a>
+               data-title=\"{t_low}\" data-desc=\"{d_low}\" data-url=\"{u_low}\" data-href=\"{u}\">
+        <a href=\"{u}\" target=\"_blank\" class=\"block shine\">{img_tag}</a>
         <div class=\"p-4\">
-          <h3 class=\"font-semibold text-lg leading-tight line-clamp-2\">{title_html}</h3>
-          <p class=\"text-sm text-slate-600 dark:text-slate-300 mt-1 line-clamp-3\">{desc_html}</p>
-          <div class=\"mt-3 text-xs text-slate-500 truncate\">{url_html}</div>
+          <h3 class=\"font-semibold text-lg leading-tight line-clamp-2\">{t}</h3>
+          <p class=\"text-sm text-slate-600 dark:text-slate-300 mt-1 line-clamp-3\">{d}</p>
+          <div class=\"mt-3 text-xs text-slate-500 truncate\">{u}</div>
         </div>
       </article>
     """
-
-
-def write_site(output_dir: Path, items: list[dict], title: str, desc: str) -> None:
-    html = build_html(items, title, desc)
-    (output_dir / "index.html").write_text(html, encoding="utf-8")
+CARD_IMG_TEMPLATE = '<img src="{img}" alt="{t}" class="w-full h-44 object-cover rounded-t-2xl" loading="lazy">'
+CARD_NO_IMG = '<div class="w-full h-44 bg-slate-200 dark:bg-slate-700 rounded-t-2xl"></div>'
+
+
+@functools.lru_cache(maxsize=1024)
+def _render_card(title: str, desc: str, url: str, img: str) -> str:
+    # Cacheado por (title, desc, url, img): filas repetidas en el CSV no se vuelven a renderizar
+    t = escape(title or url, quote=True)
+    fields = {
+        "t": t,
+        "d": escape(desc, quote=True),
+        "u": escape(url, quote=True),
+        # Versiones en minúsculas para la búsqueda en vivo (se calculan una vez)
+        "t_low": escape((title or url).lower(), quote=True),
+        "d_low": escape(desc.lower(), quote=True),
+        "u_low": escape(url.lower(), quote=True),
+        "img_tag": CARD_IMG_TEMPLATE.format_map({"img": escape(img, quote=True), "t": t}) if img else CARD_NO_IMG,
+    }
+    return CARD_TEMPLATE.format_map(fields)
+
+
+def write_site(output_dir: Path, items: Iterable[dict], title: str, desc: str) -> None:
+    (output_dir / "styles.css").write_text(STYLES_CSS, encoding="utf-8")
+    # Escribe por fragmentos: no arma la página completa en memoria
+    with open(output_dir / "index.html", "w", encoding="utf-8") as f:
+        for chunk in iter_html(items, title, desc):
+            f.write(chunk)
 
 
 def make_sample(csv_path: Path) -> None:
@@ -317,6 +911,8 @@ def main():
     ap.add_argument("--description", dest="portal_desc", default="Accesos directos favoritos", help="Descripción breve del portal")
     ap.add_argument("--take-screenshots", action="store_true", help="Tomar screenshots cuando falte imagen (requiere Playwright)")
     ap.add_argument("--fullpage", action="store_true", help="Screenshots de página completa")
+    ap.add_argument("--concurrency", type=int, default=5, help="Screenshots simultáneos (default: 5; 1 = secuencial)")
+    ap.add_argument("--workers", type=int, default=1, help="Procesos de captura, cada uno con su Chromium (default: 1 = sin pool)")
     ap.add_argument("--make-sample", dest="sample_csv", help="Crear un CSV de ejemplo en la ruta dada y salir")
     args = ap.parse_args()
 
@@ -335,15 +931,14 @@ def main():
     assets_dir = out_dir / "assets"
     ensure_dir(assets_dir)
 
-    rows = read_csv_rows(input_csv)
+    # Las imágenes se resuelven en lote (descargas/screenshots en paralelo), así que aquí sí se materializan las filas
+    rows = list(iter_csv_rows(input_csv))
 
-    items = []
-    for row in rows:
-        img_rel = prepare_image(assets_dir, row.get("title", ""), row.get("url", ""), row.get("image", ""), args.take_screenshots)
-        row["image_final"] = img_rel
-        items.append(row)
+    cache = prepare_images(rows, assets_dir, args.take_screenshots, concurrency=args.concurrency,
+                           full_page=args.fullpage, cache=load_cache(out_dir), workers=args.workers)
 
-    write_site(out_dir, items, args.portal_title, args.portal_desc)
+    write_site(out_dir, rows, args.portal_title, args.portal_desc)
+    save_cache(out_dir, cache)
 
     print(f"\n[OK] Portal generado en: {out_dir.resolve()}")
     print("  - Abre index.html en tu navegador")